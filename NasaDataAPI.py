@@ -1,9 +1,19 @@
+import os
+import hashlib
 import requests
-import json
+import orjson
 import time
+from requests.adapters import HTTPAdapter
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import geopandas as gpd
+import pyogrio
 import pandas as pd
-from shapely.geometry import Polygon
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
 from shapely.ops import unary_union
 
 ##############################
@@ -11,54 +21,166 @@ from shapely.ops import unary_union
 ##############################
 ADMIN_SHAPEFILE_PATH = "NasaKG/boundaries/boundaries.shp"
 
+# Raw CMR entries are staged here between the fetch and transform steps
+CMR_RAW_PARQUET_PATH = "cmr_raw.parquet"
+
+# All geometry work happens in lon/lat (EPSG:4326): NASA CMR coordinates are
+# already lon/lat, and the admin boundaries are brought to EPSG:4326 once when
+# loaded. 'intersects' is valid in lon/lat, so nothing is reprojected per run.
+CRS = "EPSG:4326"
+
+# Adjust column names to your shapefile fields
+CITY_COL = 'NAME_2'       # or something similar
+COUNTRY_COL = 'ADMIN'     # e.g. for country name
+CONTINENT_COL = 'CONTINENT'
+ADMIN_COLS = [CITY_COL, COUNTRY_COL, CONTINENT_COL]
+
+# Admin polygons are simplified to this tolerance (degrees) when loaded;
+# sub-kilometre border detail doesn't change which areas a dataset touches
+ADMIN_SIMPLIFY_TOLERANCE = 0.01
+
 
 ##############################
 #  (1) Fetch Data
 ##############################
+CMR_URL = "https://cmr.earthdata.nasa.gov/search/collections.json"
+CMR_CLIENT_ID = "NasaKG"
+MAX_RETRIES = 5             # retries per page on 429 / 5xx
+
+# One shared session so every page reuses a kept-alive TCP/TLS connection
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+
+def _get_with_retry(params, headers):
+    """
+    GET a single CMR page, retrying with exponential backoff on
+    429 / 5xx responses (honouring 'Retry-After' when CMR sends it).
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        response = SESSION.get(CMR_URL, params=params, headers=headers, timeout=30)
+        if response.status_code == 429 or response.status_code >= 500:
+            if attempt < MAX_RETRIES:
+                retry_after = response.headers.get("Retry-After", "")
+                time.sleep(float(retry_after) if retry_after.isdigit() else 2 ** attempt)
+                continue
+        response.raise_for_status()
+        return response
+
+
 def fetch_nasa_cmr_all_pages(page_size=200, max_pages=None):
     """
     Fetches dataset 'collections' from NASA's CMR API.
     - page_size: results per page
     - max_pages: optionally limit total pages
-    Returns a list of dataset entries.
+    Yields dataset entries one at a time.
+
+    Paginates with CMR's 'CMR-Search-After' header rather than 'page_num',
+    so every page costs the server the same regardless of depth.
+    Only one page is decoded (with orjson) at a time, so the caller can
+    process entries while later pages are still to be fetched.
+
+    A request or decode error is reported and re-raised, so a caller can
+    tell an aborted fetch from a complete one.
     """
-    cmr_url = "https://cmr.earthdata.nasa.gov/search/collections.json"
-    all_data = []
-    page_num = 1
+    params = {"page_size": page_size}
+    headers = {"Client-Id": CMR_CLIENT_ID}
+    page_count = 0
+    total_count = 0
 
     while True:
-        params = {
-            "page_size": page_size,
-            "page_num": page_num
-        }
         try:
-            response = requests.get(cmr_url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-
-            # If there's no valid data, stop
-            if "feed" not in data or "entry" not in data["feed"] or not data["feed"]["entry"]:
-                break
-
-            entries = data["feed"]["entry"]
-            all_data.extend(entries)
+            response = _get_with_retry(params, headers)
+            data = orjson.loads(response.content)
+        except requests.exceptions.Timeout:
+            print("Request timed out. Ending fetch loop.")
+            raise
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            print(f"Error fetching NASA CMR data: {e}")
+            raise
 
-            print(f"Fetched page {page_num}, total datasets so far: {len(all_data)}")
+        # If there's no valid data, stop
+        entries = data.get("feed", {}).get("entry", [])
+        if not entries:
+            break
 
-            page_num += 1
-            time.sleep(0.2)  # small delay to avoid rapid requests
+        yield from entries
 
-            if max_pages and page_num > max_pages:
-                break
+        page_count += 1
+        total_count += len(entries)
+        print(f"Fetched page {page_count}, total datasets so far: {total_count}")
 
-        except requests.exceptions.Timeout:
-            print("Request timed out. Ending fetch loop.")
+        if max_pages and page_count >= max_pages:
             break
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching NASA CMR data: {e}")
+
+        # Echo the cursor back to CMR to get the next page
+        search_after = response.headers.get("CMR-Search-After")
+        if not search_after:
             break
+        headers["CMR-Search-After"] = search_after
+
+
+# Raw CMR fields kept between fetch and transform ('links' holds JSON text,
+# since link objects don't share a fixed set of keys)
+CMR_RAW_SCHEMA = pa.schema([
+    ("short_name", pa.string()),
+    ("title", pa.string()),
+    ("summary", pa.string()),
+    ("original_format", pa.string()),
+    ("links", pa.string()),
+    ("boxes", pa.list_(pa.string())),
+    ("polygons", pa.list_(pa.list_(pa.string()))),
+    ("points", pa.list_(pa.string())),
+    ("time_start", pa.string()),
+    ("time_end", pa.string()),
+    ("platforms", pa.list_(pa.string())),
+])
+
+
+def write_cmr_raw_parquet(entries, output_file=CMR_RAW_PARQUET_PATH, batch_size=200):
+    """
+    Persist fetched CMR entries to Parquet, one row group per `batch_size`
+    entries, so the transform step can be rerun without refetching.
+    Returns the number of entries written.
 
-    return all_data
+    Rows go to a temporary file that only replaces `output_file` once
+    `entries` is exhausted; if iterating it raises (e.g. an aborted fetch),
+    the previously staged file is left untouched.
+    """
+    tmp_file = output_file + ".tmp"
+    total = 0
+    try:
+        with pq.ParquetWriter(tmp_file, CMR_RAW_SCHEMA) as writer:
+            for batch in _iter_chunks(entries, batch_size):
+                rows = []
+                for entry in batch:
+                    row = {name: entry.get(name) for name in CMR_RAW_SCHEMA.names}
+                    if "links" in entry:
+                        row["links"] = orjson.dumps(entry["links"]).decode()
+                    rows.append(row)
+                writer.write_table(pa.Table.from_pylist(rows, schema=CMR_RAW_SCHEMA))
+                total += len(rows)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+    os.replace(tmp_file, output_file)
+    return total
+
+
+def read_cmr_raw_parquet(input_file=CMR_RAW_PARQUET_PATH):
+    """
+    Yield the CMR entries stored by `write_cmr_raw_parquet`, reading only the
+    columns the transform uses. Fields that were absent come back absent.
+    """
+    parquet_file = pq.ParquetFile(input_file)
+    for batch in parquet_file.iter_batches(columns=CMR_RAW_SCHEMA.names):
+        for row in batch.to_pylist():
+            entry = {key: value for key, value in row.items() if value is not None}
+            if "links" in entry:
+                entry["links"] = orjson.loads(entry["links"])
+            yield entry
 
 
 ##############################
@@ -90,287 +212,597 @@ def extract_polygons(geom):
         return None
 
 
-def parse_cmr_spatial(boxes=None, polygons=None, points=None):
+def parse_cmr_spatial(boxes, box_index, polygons, polygon_index, points, point_index, n_entries):
     """
-    Convert NASA CMR 'boxes', 'polygons', or 'points' into
-    a single Polygon/MultiPolygon if possible.
-    Skips or merges geometry as needed.
+    Convert NASA CMR 'boxes', 'polygons' and 'points' strings for *all*
+    entries into one geometry per entry, building the shapes in bulk.
+    - boxes / polygons / points: flat lists of CMR coordinate strings
+    - box_index / polygon_index / point_index: the entry index each string belongs to
+    - n_entries: total number of entries
+    Returns an object array of length n_entries: a Polygon/MultiPolygon for
+    entries with an area, a MultiPoint for entries that only have points
+    (or zero-area boxes), and None where there is no geometry.
     """
     shapes = []
-
-    # 1) Boxes -> Polygons
-    if boxes:
-        for b in boxes:
-            coords = b.split()
-            if len(coords) == 4:
-                # [SouthLat, WestLon, NorthLat, EastLon]
-                southLat, westLon, northLat, eastLon = map(float, coords)
-                poly = Polygon([
-                    (westLon, southLat),
-                    (eastLon, southLat),
-                    (eastLon, northLat),
-                    (westLon, northLat),
-                    (westLon, southLat),
-                ])
-                shapes.append(poly)
-
-    # 2) Polygons
-    if polygons:
-        for poly_list in polygons:
-            for poly_str in poly_list:
-                coords = poly_str.split()
-                if len(coords) < 6:
-                    # Not enough coords for a polygon
-                    continue
-                pairs = []
-                for i in range(0, len(coords), 2):
-                    lat = float(coords[i])
-                    lon = float(coords[i+1])
-                    pairs.append((lon, lat))
-                # Close polygon if needed
-                if pairs and pairs[0] != pairs[-1]:
-                    pairs.append(pairs[0])
-                if len(pairs) > 2:
-                    shapes.append(Polygon(pairs))
-
-    # 3) Points -> (Skipping or buffer logic could go here; currently not used)
-
-    # Merge into a single geometry, if possible
-    if not shapes:
-        return None
-    if len(shapes) == 1:
-        merged_geom = shapes[0]
-    else:
-        merged_geom = unary_union(shapes)
-
-    # Extract only Polygon/MultiPolygon
-    return extract_polygons(merged_geom)
+    shape_index = []
+    point_lon = []
+    point_lat = []
+    point_entry = []
+
+    # 1) Boxes -> Polygons (axis-aligned, so the rings are filled in directly)
+    keep = [i for i, b in enumerate(boxes) if len(b.split()) == 4]
+    if keep:
+        # [SouthLat, WestLon, NorthLat, EastLon]
+        arr = np.fromstring(" ".join(boxes[i] for i in keep), sep=" ").reshape(-1, 4)
+        entry = np.asarray(box_index)[keep]
+
+        # Zero-area boxes are really points; no polygon is built for them
+        is_point = (arr[:, 0] == arr[:, 2]) & (arr[:, 1] == arr[:, 3])
+        point_lat.append(arr[is_point, 0])
+        point_lon.append(arr[is_point, 1])
+        point_entry.append(entry[is_point])
+        arr = arr[~is_point]
+
+        coords = np.empty((len(arr), 5, 2))
+        coords[:, 0] = arr[:, [1, 0]]  # (westLon, southLat)
+        coords[:, 1] = arr[:, [3, 0]]  # (eastLon, southLat)
+        coords[:, 2] = arr[:, [3, 2]]  # (eastLon, northLat)
+        coords[:, 3] = arr[:, [1, 2]]  # (westLon, northLat)
+        coords[:, 4] = coords[:, 0]
+        shapes.append(shapely.polygons(coords))
+        shape_index.append(entry[~is_point])
+
+    # 2) Polygons (lat/lon pairs; rings are closed by shapely if needed)
+    poly_tokens = [p.split() for p in polygons]
+    keep = [i for i, t in enumerate(poly_tokens) if len(t) >= 6]
+    if keep:
+        n_pairs = np.array([len(poly_tokens[i]) // 2 for i in keep])
+        flat = np.array(
+            [tok for i in keep for tok in poly_tokens[i][:2 * (len(poly_tokens[i]) // 2)]],
+            dtype=float
+        )
+        coords = flat.reshape(-1, 2)[:, ::-1]
+        rings = shapely.linearrings(coords, indices=np.repeat(np.arange(len(keep)), n_pairs))
+        shapes.append(shapely.polygons(rings))
+        shape_index.append(np.asarray(polygon_index)[keep])
+
+    # 3) Points ("lat lon")
+    keep = [i for i, p in enumerate(points) if len(p.split()) == 2]
+    if keep:
+        arr = np.fromstring(" ".join(points[i] for i in keep), sep=" ").reshape(-1, 2)
+        point_lat.append(arr[:, 0])
+        point_lon.append(arr[:, 1])
+        point_entry.append(np.asarray(point_index)[keep])
+
+    geometries = np.full(n_entries, None, dtype=object)
+
+    if shapes:
+        shapes = np.concatenate(shapes)
+        shape_index = np.concatenate(shape_index)
+
+        # Entries with a single shape take it directly; only entries with
+        # several shapes need a union
+        order = np.argsort(shape_index, kind="stable")
+        shapes = shapes[order]
+        shape_index = shape_index[order]
+        entry_ids, starts, counts = np.unique(shape_index, return_index=True, return_counts=True)
+
+        single = counts == 1
+        geometries[entry_ids[single]] = shapes[starts[single]]
+        for entry_id, start, count in zip(entry_ids[~single], starts[~single], counts[~single]):
+            merged_geom = unary_union(shapes[start:start + count])
+            # Extract only Polygon/MultiPolygon
+            geometries[entry_id] = extract_polygons(merged_geom)
+
+    if point_entry:
+        point_lon = np.concatenate(point_lon)
+        point_lat = np.concatenate(point_lat)
+        point_entry = np.concatenate(point_entry)
+
+        # Only entries without any polygonal geometry are represented by points
+        point_only = pd.isnull(geometries[point_entry])
+        order = np.argsort(point_entry[point_only], kind="stable")
+        point_lon = point_lon[point_only][order]
+        point_lat = point_lat[point_only][order]
+        entry_ids, point_group = np.unique(point_entry[point_only][order], return_inverse=True)
+        if len(entry_ids):
+            geometries[entry_ids] = shapely.multipoints(
+                shapely.points(point_lon, point_lat), indices=point_group
+            )
+
+    return geometries
 
 
 ##############################
 #  (3) Classification Helpers
 ##############################
-def classify_bbox_scope(rows_for_dataset):
-    """
-    Given a set of admin polygons (rows) intersecting a NASA dataset geometry,
-    classify bounding box as 'city', 'country', 'continent', or 'global'.
-    Return also sets of city/country/continent names found.
-    """
-    # Adjust column names to your shapefile fields
-    CITY_COL = 'NAME_2'       # or something similar
-    COUNTRY_COL = 'ADMIN'     # e.g. for country name
-    CONTINENT_COL = 'CONTINENT'
-
-    cities = set()
-    countries = set()
-    continents = set()
-
-    for _, row in rows_for_dataset.iterrows():
-        city_val = row.get(CITY_COL)
-        country_val = row.get(COUNTRY_COL)
-        continent_val = row.get(CONTINENT_COL)
-        if city_val:
-            cities.add(city_val)
-        if country_val:
-            countries.add(country_val)
-        if continent_val:
-            continents.add(continent_val)
-
-    # Basic logic
-    if len(cities) == 1 and len(countries) == 1:
-        scope = 'city'
-    elif len(countries) > 1 and len(continents) == 1:
-        scope = 'continent'
-    elif len(continents) > 1:
-        scope = 'global'
-    elif len(cities) > 1 or len(countries) == 1:
-        scope = 'country'
-    else:
-        scope = 'global'  # fallback
+SCOPES = ['city', 'country', 'continent', 'global']
 
-    return {
-        'scope': scope,
-        'cities': list(cities),
-        'countries': list(countries),
-        'continents': list(continents)
-    }
+
+def _unique_codes_per_group(group_of_row, n_groups, values):
+    """
+    Factorize `values` to int codes and find the distinct codes per group
+    without any per-row Python work.
+    Returns (count of distinct names per group, list of those names per group).
+    """
+    codes, uniques = pd.factorize(values)  # missing -> -1
+    n_uniques = max(len(uniques), 1)
+
+    keep = codes >= 0
+    keys = np.unique(group_of_row[keep] * n_uniques + codes[keep])
+    key_groups = keys // n_uniques
+
+    counts = np.bincount(key_groups, minlength=n_groups)
+    found = np.asarray(uniques, dtype=object)[keys % n_uniques]
+    names = [chunk.tolist() for chunk in np.split(found, np.cumsum(counts)[:-1])] if n_groups else []
+    return counts, names
+
+
+def classify_bbox_scope(joined):
+    """
+    Given the (dataset_index, admin names) rows from `bulk_find_admin_areas`,
+    classify every dataset's bounding box as 'city', 'country', 'continent',
+    or 'global' in one vectorized pass.
+    Returns a DataFrame indexed by dataset_index with the 'scope' plus lists
+    of the 'cities', 'countries' and 'continents' names found.
+    """
+    # Missing columns and empty names count as "no name"
+    names = joined.reindex(columns=["dataset_index"] + ADMIN_COLS)
+    names[ADMIN_COLS] = names[ADMIN_COLS].mask(names[ADMIN_COLS] == "")
+
+    groups, group_of_row = np.unique(names["dataset_index"].to_numpy(), return_inverse=True)
+    n_groups = len(groups)
+
+    n_cities, cities = _unique_codes_per_group(group_of_row, n_groups, names[CITY_COL])
+    n_countries, countries = _unique_codes_per_group(group_of_row, n_groups, names[COUNTRY_COL])
+    n_continents, continents = _unique_codes_per_group(group_of_row, n_groups, names[CONTINENT_COL])
+
+    # Basic logic (first matching condition wins)
+    scope_codes = np.select(
+        [
+            (n_cities == 1) & (n_countries == 1),
+            (n_countries > 1) & (n_continents == 1),
+            n_continents > 1,
+            (n_cities > 1) | (n_countries == 1),
+        ],
+        [SCOPES.index('city'), SCOPES.index('continent'), SCOPES.index('global'), SCOPES.index('country')],
+        default=SCOPES.index('global')  # fallback
+    )
+
+    return pd.DataFrame(
+        {
+            "scope": pd.Categorical.from_codes(scope_codes, categories=SCOPES),
+            "cities": cities,
+            "countries": countries,
+            "continents": continents
+        },
+        index=pd.Index(groups, name="dataset_index")
+    )
 
 
 ##############################
 #  (4) Bulk Intersection
 ##############################
-def bulk_find_admin_areas(nasa_gdf, admin_shapefile_path):
+def load_admin_boundaries(admin_shapefile_path):
     """
-    1) Reads admin shapefile once.
-    2) Does a single spatial join with all NASA polygons in `nasa_gdf`.
-    3) Returns a DataFrame that has columns from both NASA GDF and admin shapefile,
-       including 'dataset_index' to identify each NASA polygon.
+    Read only the city/country/continent columns (plus geometry) of the
+    admin shapefile via pyogrio, skipping rows that have none of those names.
+
+    Polygons are simplified to ADMIN_SIMPLIFY_TOLERANCE to cut the vertex
+    count every intersection test has to walk.
+
+    The result is cached as a Feather file next to the shapefile, and later
+    runs load that instead. The cache file name carries a hash of the
+    settings that shape it (ADMIN_COLS, ADMIN_SIMPLIFY_TOLERANCE, CRS), and
+    it is rebuilt whenever any of the shapefile's component files is newer.
     """
-    admin_gdf = gpd.read_file(admin_shapefile_path)
+    root = os.path.splitext(admin_shapefile_path)[0]
+    settings = repr((ADMIN_COLS, ADMIN_SIMPLIFY_TOLERANCE, CRS)).encode()
+    cache_path = f"{root}.{hashlib.sha1(settings).hexdigest()[:10]}.feather"
+
+    source_files = [admin_shapefile_path] + [
+        root + ext for ext in (".dbf", ".shx", ".prj", ".cpg") if os.path.exists(root + ext)
+    ]
+    if (os.path.exists(cache_path) and
+            os.path.getmtime(cache_path) >= max(os.path.getmtime(f) for f in source_files)):
+        return gpd.read_feather(cache_path)
+
+    fields = set(pyogrio.read_info(admin_shapefile_path)["fields"])
+    name_cols = [col for col in ADMIN_COLS if col in fields]
+    where = " OR ".join(f"{col} IS NOT NULL" for col in name_cols) or None
+
+    admin_gdf = gpd.read_file(
+        admin_shapefile_path,
+        engine="pyogrio",
+        columns=name_cols,
+        where=where
+    )
+
+    # Bring the admin polygons to lon/lat once here (and in the cache), only
+    # if the shapefile isn't already; a shapefile without a .prj is assumed
+    # to be lon/lat
+    if admin_gdf.crs is None:
+        admin_gdf = admin_gdf.set_crs(CRS)
+    elif admin_gdf.crs != CRS:
+        admin_gdf = admin_gdf.to_crs(CRS)
+
+    admin_gdf["geometry"] = shapely.simplify(
+        admin_gdf.geometry.values, tolerance=ADMIN_SIMPLIFY_TOLERANCE, preserve_topology=True
+    )
+
+    try:
+        admin_gdf.to_feather(cache_path)
+    except OSError as e:
+        print(f"Could not cache admin boundaries to {cache_path}: {e}")
+
+    return admin_gdf
 
-    # Ensure both GeoDataFrames share the same CRS
-    if nasa_gdf.crs is None:
-        nasa_gdf.set_crs(admin_gdf.crs, inplace=True)
-    else:
-        nasa_gdf = nasa_gdf.to_crs(admin_gdf.crs)
 
-    # Perform a spatial join (intersects)
-    joined = gpd.sjoin(nasa_gdf, admin_gdf, how="left", predicate="intersects")
+def bulk_find_admin_areas(nasa_gdf, admin_shapefile_path):
+    """
+    1) Reads admin shapefile once.
+    2) Queries an STRtree of all NASA polygons in `nasa_gdf` with the prepared
+       admin polygons; point-like NASA geometries (MultiPoints) are instead
+       tested directly against each prepared admin polygon with contains_xy.
+    3) Returns a DataFrame with one row per intersecting (NASA geometry, admin polygon)
+       pair: 'dataset_index' to identify the NASA geometry, plus the admin
+       city/country/continent columns. NASA geometries without any match have no rows.
+    """
+    admin_gdf = load_admin_boundaries(admin_shapefile_path)
+
+    # Both sides must already be in lon/lat (see CRS above)
+    assert nasa_gdf.crs == admin_gdf.crs == CRS, (nasa_gdf.crs, admin_gdf.crs)
+
+    # Prepare the (complex) admin polygons once. STRtree.query evaluates the
+    # predicate with the *input* geometries prepared, so the tree is built over
+    # the simple NASA shapes and queried with the admin polygons.
+    admin_geoms = np.asarray(admin_gdf.geometry.values)
+    shapely.prepare(admin_geoms)
+
+    nasa_geoms = np.asarray(nasa_gdf.geometry.values)
+    is_point = shapely.get_type_id(nasa_geoms) == shapely.GeometryType.MULTIPOINT
+
+    # Find all intersecting (admin, nasa) index pairs of the polygonal
+    # geometries in one bulk query
+    polygonal = np.flatnonzero(~is_point)
+    tree = shapely.STRtree(nasa_geoms[polygonal])
+    admin_idx, nasa_idx = tree.query(admin_geoms, predicate="intersects")
+    admin_idx = [admin_idx]
+    nasa_idx = [polygonal[nasa_idx]]
+
+    # Point-like geometries need no polygon or tree at all: test their
+    # coordinates against each prepared admin polygon
+    coords, point_row = shapely.get_coordinates(nasa_geoms[is_point], return_index=True)
+    point_row = np.flatnonzero(is_point)[point_row]
+    if len(coords):
+        for i, admin_geom in enumerate(admin_geoms):
+            hits = point_row[shapely.contains_xy(admin_geom, coords[:, 0], coords[:, 1])]
+            admin_idx.append(np.full(len(hits), i))
+            nasa_idx.append(hits)
+
+    admin_idx = np.concatenate(admin_idx)
+    nasa_idx = np.concatenate(nasa_idx)
+
+    # Only the name columns the shapefile actually has are carried over
+    name_cols = [col for col in ADMIN_COLS if col in admin_gdf.columns]
+    admin_names = admin_gdf[name_cols].to_numpy()[admin_idx]
+    joined = pd.DataFrame(admin_names, columns=name_cols)
+    joined.insert(0, "dataset_index", nasa_gdf["dataset_index"].to_numpy()[nasa_idx])
     return joined
 
 
 ##############################
 #  (5) Main Transformation
 ##############################
-def transform_cmr_to_classes(all_entries):
+LOCATION_CATEGORIES = SCOPES + ['unclassified']
+ENTRY_CHUNK_SIZE = 1000     # entries per geometry/date parsing chunk
+
+
+def _parse_spatial(chunk):
     """
-    Build final classification in a single pass:
-      - Parse geometry for each dataset
-      - Build a GeoDataFrame of all NASA polygons
-      - Do a single spatial join with the admin shapefile
-      - Group by dataset index to find city/country/continent sets
-      - Classify scope
-      - Return structured results + fail count
+    Compute 'duration_days' and build the geometries for one chunk of entries.
+    `chunk` carries only the geometry strings (with chunk-local entry indices)
+    and the time strings, so it is cheap to send to a worker process.
+    Returns (list of durations, object array of geometries).
+    """
+    # Missing or unparseable dates leave the duration empty
+    start_dt = pd.to_datetime(pd.Series(chunk["time_start"], dtype=object),
+                              format="ISO8601", errors="coerce", utc=True)
+    end_dt = pd.to_datetime(pd.Series(chunk["time_end"], dtype=object),
+                            format="ISO8601", errors="coerce", utc=True)
+    durations = (end_dt - start_dt).dt.days.astype("Int32").tolist()
+
+    geometries = parse_cmr_spatial(
+        chunk["boxes"], chunk["box_index"],
+        chunk["polygons"], chunk["polygon_index"],
+        chunk["points"], chunk["point_index"],
+        len(chunk["time_start"])
+    )
+    return durations, geometries
+
+
+def _parse_spatial_wkb(chunk):
+    """
+    `_parse_spatial` for a worker process: geometries come back as WKB
+    (None where there is no valid geometry) so no shapely objects are pickled.
+    """
+    durations, geometries = _parse_spatial(chunk)
+    return durations, shapely.to_wkb(geometries)
 
-    Includes calculation of 'duration_days' from 'time_start' and 'time_end'.
+
+def _iter_chunks(iterable, size):
+    """Yield lists of up to `size` consecutive items from `iterable`."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_spatial_chunks(all_entries, columns):
     """
-    # Prepare final output containers
-    output = {
-        "Dataset": [],
-        "DataCategory": [],
-        "DataFormat": [],
-        "LocationCategory": [],
-        "SpatialExtent": [],
-        "Station": []
+    Append each entry's plain output fields to `columns` and yield, per
+    ENTRY_CHUNK_SIZE entries, the chunk's geometry and time strings for
+    `_parse_spatial`.
+    """
+    for entries in _iter_chunks(all_entries, ENTRY_CHUNK_SIZE):
+        chunk = {
+            "boxes": [], "box_index": [],
+            "polygons": [], "polygon_index": [],
+            "points": [], "point_index": [],
+            "time_start": [], "time_end": []
+        }
+
+        for idx, entry in enumerate(entries):
+            # A) Dataset
+            columns["short_name"].append(entry.get("short_name", "N/A"))
+            columns["title"].append(entry.get("title", "N/A"))
+            columns["links"].append(entry.get("links", []))
+
+            # B) DataCategory
+            columns["summary"].append(entry.get("summary", "N/A"))
+
+            # C) DataFormat
+            columns["original_format"].append(entry.get("original_format", "N/A"))
+
+            # D) Collect geometry strings (parsed in bulk per chunk)
+            boxes = entry.get("boxes", [])
+            polygons = entry.get("polygons", [])
+            points = entry.get("points", [])
+            chunk["boxes"].extend(boxes)
+            chunk["box_index"].extend([idx] * len(boxes))
+            for poly_list in polygons:
+                chunk["polygons"].extend(poly_list)
+                chunk["polygon_index"].extend([idx] * len(poly_list))
+            chunk["points"].extend(points)
+            chunk["point_index"].extend([idx] * len(points))
+
+            # E) SpatialExtent (duration is computed in bulk per chunk)
+            columns["boxes"].append(boxes)
+            columns["polygons"].append(polygons)
+            columns["points"].append(points)
+            chunk["time_start"].append(entry.get("time_start"))
+            chunk["time_end"].append(entry.get("time_end"))
+
+            # F) Station
+            columns["platforms"].append(entry.get("platforms", []))
+
+        columns["time_start"].extend(chunk["time_start"])
+        columns["time_end"].extend(chunk["time_end"])
+        yield chunk
+
+
+def _parse_entries(all_entries, max_workers=None):
+    """
+    Collect every entry's output fields into column lists, plus
+    'duration_days' and an object array of geometries under 'geometry'.
+
+    The plain fields are gathered here; only the geometry/date parsing of
+    each chunk goes to a process pool, and only when there is more than one
+    chunk and more than one worker. Otherwise everything runs in-process.
+    In the pool, at most two chunks per worker are in flight, so a streamed
+    input is still consumed as it arrives.
+    """
+    max_workers = max_workers or os.cpu_count()
+    columns = {
+        "short_name": [], "title": [], "links": [],
+        "summary": [],
+        "original_format": [],
+        "boxes": [], "polygons": [], "points": [],
+        "time_start": [], "time_end": [],
+        "platforms": []
     }
+    durations = []
+    geometries = [np.array([], dtype=object)]
+
+    chunks = _iter_spatial_chunks(all_entries, columns)
+    head = [chunk for chunk in (next(chunks, None), next(chunks, None)) if chunk is not None]
+    chunks = chain(head, chunks)
+
+    if max_workers == 1 or len(head) < 2:
+        for chunk in chunks:
+            chunk_durations, chunk_geometries = _parse_spatial(chunk)
+            durations.extend(chunk_durations)
+            geometries.append(chunk_geometries)
+    else:
+        pending = deque()
 
-    # 1) Parse geometry for each entry
-    geoms = []
-    fail_count = 0
+        def merge(future):
+            chunk_durations, chunk_wkb = future.result()
+            durations.extend(chunk_durations)
+            geometries.append(shapely.from_wkb(chunk_wkb))
 
-    for idx, entry in enumerate(all_entries):
-        # A) Dataset
-        dataset_obj = {
-            "short_name": entry.get("short_name", "N/A"),
-            "title": entry.get("title", "N/A"),
-            "links": entry.get("links", [])
-        }
-        output["Dataset"].append(dataset_obj)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for chunk in chunks:
+                pending.append(executor.submit(_parse_spatial_wkb, chunk))
+                if len(pending) >= 2 * max_workers:
+                    merge(pending.popleft())
+            while pending:
+                merge(pending.popleft())
 
-        # B) DataCategory
-        data_category_obj = {
-            "summary": entry.get("summary", "N/A")
-        }
-        output["DataCategory"].append(data_category_obj)
+    columns["duration_days"] = durations
+    columns["geometry"] = np.concatenate(geometries)
+    return columns
 
-        # C) DataFormat
-        data_format_obj = {
-            "original_format": entry.get("original_format", "N/A")
-        }
-        output["DataFormat"].append(data_format_obj)
-
-        # D) Parse geometry
-        boxes = entry.get("boxes", [])
-        polygons = entry.get("polygons", [])
-        points = entry.get("points", [])
-        geometry = parse_cmr_spatial(boxes, polygons, points)
-
-        # E) Compute time duration (in days) if possible
-        time_start_str = entry.get("time_start")
-        time_end_str = entry.get("time_end")
-        duration_days = None
-        if time_start_str and time_end_str:
-            try:
-                start_dt = pd.to_datetime(time_start_str)
-                end_dt = pd.to_datetime(time_end_str)
-                # Calculate difference in days (could also store in seconds)
-                duration_days = (end_dt - start_dt).days
-            except Exception:
-                # If parsing fails, leave duration as None
-                pass
-
-        # F) SpatialExtent
-        spatial_extent_obj = {
-            "boxes": boxes,
-            "polygons": polygons,
-            "points": points,
-            "place_names": [],
-            "time_start": time_start_str,
-            "time_end": time_end_str,
-            "duration_days": duration_days
-        }
 
-        # G) Station
-        station_obj = {
-            "platforms": entry.get("platforms", [])
-        }
+def transform_cmr_to_classes(all_entries):
+    """
+    Build final classification in a single pass over `all_entries`
+    (any iterable, e.g. the fetch generator, so entries are transformed
+    as they stream in rather than after the whole harvest is in memory):
+      - Parse fields and geometry for each dataset
+      - Build a GeoDataFrame of all NASA polygons
+      - Do a single spatial join with the admin shapefile
+      - Group by dataset index to find city/country/continent sets
+      - Classify scope
+      - Return structured results + fail count
 
-        if geometry is None:
-            fail_count += 1
-            # Mark unclassified if we don't have a valid geometry
-            output["LocationCategory"].append({"category": "unclassified"})
-            output["SpatialExtent"].append(spatial_extent_obj)
-            output["Station"].append(station_obj)
-            continue
+    Each class ('Dataset', 'SpatialExtent', ...) is returned as a typed
+    DataFrame with one row per dataset; use `output_to_records` to get the
+    nested JSON structure.
 
-        # Valid geometry: store it for the bulk intersection
-        geoms.append({"dataset_index": idx, "geometry": geometry})
+    Includes calculation of 'duration_days' from 'time_start' and 'time_end'.
+    """
+    # 1) Parse entries (geometry and dates in parallel chunks when worthwhile)
+    columns = _parse_entries(all_entries)
+    n_entries = len(columns["short_name"])
+    geometries = columns["geometry"]
+
+    # Every dataset starts 'unclassified' with no place names
+    category = pd.Categorical(
+        np.full(n_entries, "unclassified", dtype=object), categories=LOCATION_CATEGORIES
+    )
+    place_names = [[] for _ in range(n_entries)]
+
+    # Datasets without a valid geometry stay unclassified
+    valid = np.flatnonzero(pd.notnull(geometries))
+    fail_count = n_entries - len(valid)
+
+    if len(valid):
+        # Build a GeoDataFrame from the valid geometries
+        nasa_gdf = gpd.GeoDataFrame(
+            {"dataset_index": valid},
+            geometry=geometries[valid],
+            crs=CRS
+        )
 
-        # Push placeholders for classification
-        output["LocationCategory"].append({"category": None})
-        output["SpatialExtent"].append(spatial_extent_obj)
-        output["Station"].append(station_obj)
+        # Single bulk intersection with the admin shapefile
+        joined = bulk_find_admin_areas(nasa_gdf, ADMIN_SHAPEFILE_PATH)
+
+        # Group by dataset_index and classify all datasets at once
+        # (geometries not intersecting any admin shape keep 'unclassified')
+        classification = classify_bbox_scope(joined)
+        dataset_index = classification.index.to_numpy()
+        category[dataset_index] = classification["scope"].astype(str).to_numpy()
+        for i, cities, countries, continents in zip(
+            dataset_index,
+            classification["cities"],
+            classification["countries"],
+            classification["continents"]
+        ):
+            place_names[i] = cities + countries + continents
 
-    # If no valid geometries, return now
-    if not geoms:
-        return output, fail_count
+    # 2) Assemble one typed DataFrame per class
+    string_dtype = "string[pyarrow]"
+    output = {
+        "Dataset": pd.DataFrame({
+            "short_name": pd.array(columns["short_name"], dtype=string_dtype),
+            "title": pd.array(columns["title"], dtype=string_dtype),
+            "links": columns["links"]
+        }),
+        "DataCategory": pd.DataFrame({
+            "summary": pd.array(columns["summary"], dtype=string_dtype)
+        }),
+        "DataFormat": pd.DataFrame({
+            "original_format": pd.array(columns["original_format"], dtype=string_dtype)
+        }),
+        "LocationCategory": pd.DataFrame({
+            "category": category
+        }),
+        "SpatialExtent": pd.DataFrame({
+            "boxes": columns["boxes"],
+            "polygons": columns["polygons"],
+            "points": columns["points"],
+            "place_names": place_names,
+            "time_start": pd.array(columns["time_start"], dtype=string_dtype),
+            "time_end": pd.array(columns["time_end"], dtype=string_dtype),
+            "duration_days": pd.array(columns["duration_days"], dtype="Int32")
+        }),
+        "Station": pd.DataFrame({
+            "platforms": columns["platforms"]
+        })
+    }
 
-    # Build a GeoDataFrame from these geometries
-    nasa_gdf = gpd.GeoDataFrame(geoms, geometry="geometry", crs="EPSG:4326")
+    return output, fail_count
 
-    # Single bulk intersection with the admin shapefile
-    joined = bulk_find_admin_areas(nasa_gdf, ADMIN_SHAPEFILE_PATH)
 
-    # Group by dataset_index to gather all matching admin polygons
-    grouped = joined.groupby("dataset_index")
+def output_to_records(output):
+    """
+    Materialize the per-class DataFrames from `transform_cmr_to_classes`
+    into the nested {class: [record, ...]} structure written to JSON
+    (missing values become None).
+    """
+    records = {}
+    for class_name, df in output.items():
+        df = df.astype(object)
+        records[class_name] = df.where(df.notna(), None).to_dict(orient="records")
+    return records
 
-    # Classify each dataset using the grouped admin polygons
-    for dataset_index, rows in grouped:
-        classification = classify_bbox_scope(rows)
 
-        # Fill classification in the output
-        output["LocationCategory"][dataset_index]["category"] = classification["scope"]
+NDJSON_CHUNK_SIZE = 10000   # rows materialized at a time when writing NDJSON
 
-        place_names = (
-            classification["cities"] +
-            classification["countries"] +
-            classification["continents"]
-        )
-        output["SpatialExtent"][dataset_index]["place_names"] = place_names
 
-        # Handle the case of geometry not intersecting any admin shape
-        if len(rows) == 1 and pd.isnull(rows.iloc[0]["index_right"]):
-            output["LocationCategory"][dataset_index]["category"] = "unclassified"
-            output["SpatialExtent"][dataset_index]["place_names"] = []
+def save_structured_data(output, output_file, ndjson=False):
+    """
+    Write the transform output with orjson.
+    - ndjson=False: one indented JSON document, {class: [record, ...]}
+    - ndjson=True: one line per dataset, {class: record, ...}; records are
+      materialized NDJSON_CHUNK_SIZE rows at a time, so peak memory stays
+      bounded for very large harvests
+    """
+    options = orjson.OPT_SERIALIZE_NUMPY
+
+    with open(output_file, "wb") as f:
+        if not ndjson:
+            records = output_to_records(output)
+            f.write(orjson.dumps(records, option=options | orjson.OPT_INDENT_2))
+            return
 
-    return output, fail_count
+        n_rows = len(next(iter(output.values()), ()))
+        for start in range(0, n_rows, NDJSON_CHUNK_SIZE):
+            records = output_to_records(
+                {class_name: df.iloc[start:start + NDJSON_CHUNK_SIZE]
+                 for class_name, df in output.items()}
+            )
+            for row in zip(*records.values()):
+                f.write(orjson.dumps(dict(zip(records.keys(), row)), option=options))
+                f.write(b"\n")
 
 
 ##############################
 #  (6) Main
 ##############################
-def main():
-    # 1) Fetch NASA CMR data
-    all_data = fetch_nasa_cmr_all_pages(page_size=200, max_pages=None)
-    print(f"Total collections fetched: {len(all_data)}")
+def main(refetch=True):
+    # 1) Fetch NASA CMR data into Parquet (skipped when rerunning the
+    #    transform on an earlier fetch)
+    if refetch or not os.path.exists(CMR_RAW_PARQUET_PATH):
+        all_data = fetch_nasa_cmr_all_pages(page_size=200, max_pages=None)
+        try:
+            write_cmr_raw_parquet(all_data, CMR_RAW_PARQUET_PATH, batch_size=200)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError):
+            print(f"Fetch aborted; {CMR_RAW_PARQUET_PATH} was left as it was.")
+            return
 
     # 2) Transform & classify
-    structured_data, fail_count = transform_cmr_to_classes(all_data)
+    structured_data, fail_count = transform_cmr_to_classes(read_cmr_raw_parquet(CMR_RAW_PARQUET_PATH))
+    print(f"Total collections fetched: {len(structured_data['Dataset'])}")
 
     # 3) Save to JSON
     output_file = "cmr_final_data.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(structured_data, f, indent=2)
+    save_structured_data(structured_data, output_file)
     print(f"Saved structured data to {output_file}")
 
     # 4) Print how many datasets had geometry issues